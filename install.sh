@@ -63,7 +63,7 @@ cd "$INSTALL_DIR"
 python3 -m venv venv
 source venv/bin/activate
 pip install --upgrade pip > /dev/null 2>&1
-pip install beem requests > /dev/null 2>&1
+pip install urllib3 orjson > /dev/null 2>&1
 EOF
 
 # Step 6: Create configuration
@@ -5,14 +5,15 @@ Tests compatibility with Podscan.fm format
 """
 
 import sys
+import gzip
 import json
 import requests
 from datetime import datetime
 
-def test_endpoint(url):
+def test_endpoint(url, compress=False):
     """Test the webhook endpoint with sample data"""
     
-    print(f"🔍 Testing endpoint: {url}")
+    print(f"🔍 Testing endpoint: {url}" + (" (gzip)" if compress else ""))
     print("-" * 50)
     
     # Test payload matching PHP format
@@ -24,13 +25,20 @@ def test_endpoint(url):
         ]
     }
     
+    body = json.dumps(test_data).encode('utf-8')
+    headers = {'Content-Type': 'application/json'}
+    if compress:
+        # Same encoding the watcher uses above COMPRESS_MIN_BYTES
+        body = gzip.compress(body, compresslevel=1)
+        headers['Content-Encoding'] = 'gzip'
+    
     try:
         # Send test request
         response = requests.post(
             url,
-            json=test_data,
+            data=body,
             timeout=10,
-            headers={'Content-Type': 'application/json'}
+            headers=headers
         )
         
         print(f"✓ Status Code: {response.status_code}")
@@ -55,10 +63,13 @@ def test_endpoint(url):
         return False
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        url = sys.argv[1]
+    args = sys.argv[1:]
+    compress = "--gzip" in args
+    args = [arg for arg in args if arg != "--gzip"]
+    if args:
+        url = args[0]
     else:
         url = "http://localhost:8080/-/podping"
     
-    success = test_endpoint(url)
+    success = test_endpoint(url, compress)
     sys.exit(0 if success else 1)
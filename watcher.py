@@ -1,24 +1,37 @@
 #!/usr/bin/env python3
 """
 PodPing Watcher for Podscan.fm - Robust Version
-Better error handling and correct Beem API usage
+Better error handling and lightweight Hive JSON-RPC streaming
 """
 
+import gzip
 import json
 import logging
 import os
+import queue
 import signal
-import sys
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta, timezone
-from typing import Set, List, Dict, Any
+from typing import Set, List, Dict, Any, Deque, Iterator, Optional, Tuple, Union, final
 
-import beem
-from beem.blockchain import Blockchain
-import requests
-from requests.adapters import HTTPAdapter
+import urllib3
 from urllib3.util import Retry
 
+# orjson is optional; fall back to the stdlib parser when it's missing
+try:
+    import orjson
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+except ImportError:
+    json_loads = json.loads  # type: ignore[assignment]
+    
+    def json_dumps(obj: Any) -> bytes:  # type: ignore[misc]
+        """Serialize to compact UTF-8 JSON bytes like orjson.dumps"""
+        return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
 # Load configuration with proper trimming
 def get_env(key, default):
     """Get environment variable with whitespace trimming"""
@@ -33,6 +46,9 @@ LOOKBACK_MINUTES = int(get_env('LOOKBACK_MINUTES', '5'))
 BATCH_SIZE = int(get_env('BATCH_SIZE', '50'))
 BATCH_TIMEOUT = int(get_env('BATCH_TIMEOUT', '3'))
 DEDUPE_WINDOW = int(get_env('DEDUPE_WINDOW', '30'))
+SEND_WORKERS = int(get_env('SEND_WORKERS', '4'))
+COMPRESS_MIN_BYTES = int(get_env('COMPRESS_MIN_BYTES', '1024'))
+STATE_FILE = get_env('STATE_FILE', 'watcher-state.json')
 LOG_LEVEL = get_env('LOG_LEVEL', 'INFO')
 
 # Hive nodes - prioritize the most reliable ones
@@ -49,7 +65,37 @@ HIVE_NODES = get_env('HIVE_NODES', ','.join([
 HIVE_NODES = [node.strip() for node in HIVE_NODES if node.strip()]
 
 # Constants
-WATCHED_OPERATION_IDS = ["podping", "pp_", "pplt_", "podping-v0.3"]
+# "pp" also covers the "pp_" and "pplt_" ids; startswith beats re.match here
+WATCHED_PREFIXES = ("podping", "pp")
+# Accounts authorized to send podpings; a static list since follow_api is broken
+ALLOWED_ACCOUNTS = frozenset({
+    "podping", "podping.aaa", "podping.bbb",
+    "podping.ccc", "podping.ddd", "podping.eee",
+    "podping.fff", "podping.ggg", "podping.hhh",
+    "hivehydra", "podstation", "podping-bbb",
+    "podping-ccc", "podping-ddd", "podping-eee",
+    "podping-fff", "podping-ggg", "brianoflondon",
+    "podcastindex", "podping.legacy", "podping.spk"
+})
+# Payload fields that carry feed URLs, across podping versions
+URL_FIELDS = frozenset(("urls", "url", "iris", "iri"))
+# Tuple startswith measured faster than a compiled regex or slice compares
+URL_SCHEMES = ("http://", "https://")
+BLOCK_INTERVAL = 3        # Seconds between Hive blocks
+PROBE_TIMEOUT = 3         # Seconds a node gets to answer the connect probe
+STATS_INTERVAL = 60       # Seconds between stats log lines
+BLOCK_RANGE_SIZE = 50     # Blocks per get_block_range call
+RANGE_FETCHES = 4         # Ranges fetched concurrently while catching up
+SEND_QUEUE_SIZE = 64      # Batches waiting for a sender thread
+POST_QUEUE_SIZE = 1024    # Podpings read ahead by the stream thread
+MAX_TRACKED_URLS = 8192   # Rotate the dedupe generation early past this
+
+# Shared request headers; urllib3 copies them, so one dict serves all senders
+SEND_HEADERS = {
+    'Content-Type': 'application/json',
+    'User-Agent': 'PodPing-Watcher/1.0'
+}
+GZIP_SEND_HEADERS = {**SEND_HEADERS, 'Content-Encoding': 'gzip'}
 
 # Logging configuration
 logging.basicConfig(
@@ -58,34 +104,255 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Reduce Beem logging verbosity
-logging.getLogger('beemapi').setLevel(logging.ERROR)
-logging.getLogger('beembase').setLevel(logging.ERROR)
-
 # Log configuration at startup
-logger.info(f"Configuration loaded:")
-logger.info(f"  TARGET_URL: {TARGET_URL}")
-logger.info(f"  BATCH_SIZE: {BATCH_SIZE}")
-logger.info(f"  BATCH_TIMEOUT: {BATCH_TIMEOUT}s")
-logger.info(f"  DEDUPE_WINDOW: {DEDUPE_WINDOW}s")
-logger.info(f"  LOOKBACK_MINUTES: {LOOKBACK_MINUTES}")
-logger.info(f"  HIVE_NODES: {len(HIVE_NODES)} nodes configured")
+logger.info("Configuration loaded:")
+logger.info("  TARGET_URL: %s", TARGET_URL)
+logger.info("  BATCH_SIZE: %d", BATCH_SIZE)
+logger.info("  BATCH_TIMEOUT: %ds", BATCH_TIMEOUT)
+logger.info("  DEDUPE_WINDOW: %ds", DEDUPE_WINDOW)
+logger.info("  SEND_WORKERS: %d", SEND_WORKERS)
+logger.info("  COMPRESS_MIN_BYTES: %d", COMPRESS_MIN_BYTES)
+logger.info("  LOOKBACK_MINUTES: %d", LOOKBACK_MINUTES)
+logger.info("  STATE_FILE: %s", STATE_FILE or 'disabled')
+logger.info("  HIVE_NODES: %d nodes configured", len(HIVE_NODES))
+if DEDUPE_WINDOW < BATCH_TIMEOUT:
+    logger.warning("DEDUPE_WINDOW (%ds) is shorter than BATCH_TIMEOUT (%ds); "
+                   "batches may contain duplicate URLs", DEDUPE_WINDOW, BATCH_TIMEOUT)
+
+class HiveClient:
+    """Minimal Hive JSON-RPC client that works on raw dicts"""
+    
+    def __init__(self, nodes: List[str], timeout: int = 10):
+        self.nodes = nodes
+        self.node: Optional[str] = None
+        self.timeout = timeout
+        self.pool = urllib3.PoolManager(
+            num_pools=len(nodes),
+            maxsize=RANGE_FETCHES,
+            retries=False
+        )
+        self.fetcher = ThreadPoolExecutor(
+            max_workers=RANGE_FETCHES,
+            thread_name_prefix='fetch'
+        )
+        self.request_id = 0
+        self.next_block: Optional[int] = None
+        # Last head block seen, used to estimate the head without an RPC
+        self.anchor_block: Optional[int] = None
+        self.anchor_time: Optional[float] = None
+        
+    def call(
+        self,
+        method: str,
+        params: Any,
+        node: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> Any:
+        """Call a JSON-RPC method on the current (or a given) node"""
+        node = node or self.node
+        if not node:
+            raise Exception("Not connected to a Hive node")
+            
+        self.request_id += 1
+        response = self.pool.request(
+            "POST",
+            node,
+            body=json_dumps({
+                "jsonrpc": "2.0",
+                "method": method,
+                "params": params,
+                "id": self.request_id
+            }),
+            headers={'Content-Type': 'application/json'},
+            timeout=timeout or self.timeout
+        )
+        if response.status != 200:
+            raise Exception(f"HTTP {response.status} from {node}")
+            
+        data = json_loads(response.data)
+        if "error" in data:
+            raise Exception(f"RPC error from {node}: {data['error']}")
+        return data.get("result")
+        
+    def connect(self) -> int:
+        """Probe all nodes in parallel and switch to the first that answers"""
+        logger.info("Testing %d nodes", len(self.nodes))
+        executor = ThreadPoolExecutor(
+            max_workers=len(self.nodes),
+            thread_name_prefix='probe'
+        )
+        futures = {}
+        try:
+            for node in self.nodes:
+                future = executor.submit(self.fetch_head_block, node, PROBE_TIMEOUT)
+                futures[future] = node
+            for future in as_completed(futures):
+                node = futures[future]
+                try:
+                    current_block = future.result()
+                except Exception as e:
+                    logger.warning("Failed %s: %.100s", node, e)
+                    continue
+                    
+                self.node = node
+                self.anchor_block = current_block
+                self.anchor_time = time.monotonic()
+                logger.info("✓ Connected to %s at block %d", node, current_block)
+                return current_block
+        finally:
+            # Don't wait for slower probes once one node has answered
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+            
+        self.node = None
+        raise Exception("Could not connect to any Hive node")
+        
+    def fetch_head_block(
+        self,
+        node: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> int:
+        """Get the head block number from the current (or a given) node"""
+        props = self.call(
+            "condenser_api.get_dynamic_global_properties", [],
+            node=node,
+            timeout=timeout
+        )
+        return props["head_block_number"]
+        
+    def get_current_block_num(self) -> int:
+        """Get the current head block number"""
+        current_block = self.fetch_head_block()
+        self.anchor_block = current_block
+        self.anchor_time = time.monotonic()
+        return current_block
+        
+    def estimate_head_block(self) -> int:
+        """Estimate the head block from the last one seen and the block time"""
+        if self.anchor_block is None or self.anchor_time is None:
+            return self.get_current_block_num()
+        elapsed = time.monotonic() - self.anchor_time
+        return self.anchor_block + int(elapsed / BLOCK_INTERVAL)
+        
+    def get_block_range(self, start_block: int, count: int) -> List[Dict[str, Any]]:
+        """Get up to count consecutive blocks; fewer if the head is reached"""
+        result = self.call(
+            "block_api.get_block_range",
+            {"starting_block_num": start_block, "count": count}
+        )
+        return result["blocks"]
+        
+    def stream(
+        self,
+        start_block: Optional[int] = None,
+        id_prefixes: Tuple[str, ...] = ("",)
+    ) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Yield (block number, custom_json op) for matching ids, following the head"""
+        block_num = start_block
+        if block_num is None:
+            block_num = self.estimate_head_block()
+        self.next_block = block_num
+        
+        while True:
+            # Pipeline several ranges while catching up, one at the head
+            behind = self.estimate_head_block() - block_num
+            ranges = max(1, min(RANGE_FETCHES, behind // BLOCK_RANGE_SIZE))
+            futures = [
+                self.fetcher.submit(
+                    self.get_block_range,
+                    block_num + i * BLOCK_RANGE_SIZE,
+                    BLOCK_RANGE_SIZE
+                )
+                for i in range(ranges)
+            ]
+            
+            fetched = 0
+            for future in futures:
+                blocks = future.result()
+                for block in blocks:
+                    for transaction in block["transactions"]:
+                        for op in transaction["operations"]:
+                            # block_api uses {"type", "value"}, condenser_api pairs
+                            if type(op) is dict:
+                                if op["type"] != "custom_json_operation":
+                                    continue
+                                op = op["value"]
+                            elif op[0] == "custom_json":
+                                op = op[1]
+                            else:
+                                continue
+                                
+                            # Filter here so unrelated ops never leave the generator
+                            if op["id"].startswith(id_prefixes):
+                                yield block_num, op
+                                
+                    block_num += 1
+                    self.next_block = block_num
+                    
+                fetched += len(blocks)
+                if len(blocks) < BLOCK_RANGE_SIZE:
+                    # Reached the head; re-anchor since missed slots make the
+                    # estimate run ahead and fan out empty range fetches
+                    self.anchor_block = block_num - 1
+                    self.anchor_time = time.monotonic()
+                    break  # Later ranges are empty
+                    
+            if not fetched:
+                # Caught up with the head, wait for the next block
+                time.sleep(1)
 
+@final
 class PodPingWatcher:
-    def __init__(self):
+    def __init__(self) -> None:
         self.running = True
-        self.http_session = self._create_http_session()
-        self.url_buffer = []
-        self.last_flush_time = time.time()
-        self.recent_url_times = {}
-        self.stats = {
+        # Every podping from blocks before this one has been processed
+        self.resume_block: Optional[int] = None
+        self.state_file: Optional[str] = STATE_FILE
+        # Instance copies of hot-path settings avoid global lookups per URL
+        self.batch_size = BATCH_SIZE
+        self.batch_timeout = BATCH_TIMEOUT
+        self.dedupe_window = DEDUPE_WINDOW
+        self.http_pool = self._create_http_pool()
+        # Batches carry the oldest block their URLs may have come from
+        self.send_queue: 'queue.Queue[Tuple[int, List[str]]]' = queue.Queue(maxsize=SEND_QUEUE_SIZE)
+        self.url_buffer: Deque[str] = deque()  # Emptied by every flush
+        self.retry_urls: Deque[str] = deque(maxlen=100)
+        # Checkpoint bookkeeping: URLs from blocks before flushed_block are
+        # in a batch, and a block is only saved once no batch or held-back
+        # retry from it is still unresolved
+        self.progress_lock = threading.Lock()
+        self.flushed_block: Optional[int] = None
+        self.pending_batches: Dict[int, int] = {}
+        self.retry_block: Optional[int] = None
+        self.saved_block: Optional[int] = None
+        self.stats_lock = threading.Lock()
+        self.last_flush_time = time.monotonic()
+        self.recent_urls: Set[str] = set()
+        self.previous_urls: Set[str] = set()
+        self.window_start = time.monotonic()
+        self.stats: Dict[str, Any] = {
             'processed': 0,
             'sent': 0,
             'deduped': 0,
             'errors': 0,
             'start_time': datetime.now(timezone.utc)
         }
+        # Uptime for the rate; start_time above is kept for display
+        self.start_monotonic = time.monotonic()
+        self.stopped = threading.Event()
         self.setup_signal_handlers()
+        for i in range(SEND_WORKERS):
+            threading.Thread(
+                target=self.sender_loop,
+                name=f'sender-{i}',
+                daemon=True
+            ).start()
+        threading.Thread(
+            target=self.stats_loop,
+            name='stats',
+            daemon=True
+        ).start()
         
     def setup_signal_handlers(self):
         """Setup graceful shutdown handlers"""
@@ -94,265 +361,408 @@ class PodPingWatcher:
         
     def shutdown(self, signum, frame):
         """Graceful shutdown"""
+        # Only flip the flag: the main thread may hold the queue or stats
+        # locks right now, so run() returns and main() drains instead
         logger.info("Shutdown signal received, flushing remaining URLs...")
         self.running = False
-        self.flush_urls()
-        logger.info(f"Final stats: {self.stats}")
-        sys.exit(0)
         
-    def _create_http_session(self):
-        """Create HTTP session with retry logic"""
-        session = requests.Session()
+    def _create_http_pool(self):
+        """Create urllib3 connection pool with retry logic"""
         retry_strategy = Retry(
             total=3,
             backoff_factor=1,
             status_forcelist=[429, 500, 502, 503, 504],
             allowed_methods=["POST"]
         )
-        adapter = HTTPAdapter(
-            max_retries=retry_strategy,
-            pool_connections=10,
-            pool_maxsize=20
+        # One target host; keep one warm connection per sender thread
+        return urllib3.PoolManager(
+            num_pools=1,
+            maxsize=SEND_WORKERS,
+            retries=retry_strategy,
+            timeout=urllib3.Timeout(connect=3, read=10)
         )
-        session.mount("http://", adapter)
-        session.mount("https://", adapter)
-        return session
         
-    def get_allowed_accounts(self) -> Set[str]:
-        """Get list of accounts authorized to send podpings"""
-        # Use comprehensive fallback list since follow_api is broken
-        return {
-            "podping", "podping.aaa", "podping.bbb", 
-            "podping.ccc", "podping.ddd", "podping.eee",
-            "podping.fff", "podping.ggg", "podping.hhh",
-            "hivehydra", "podstation", "podping-bbb",
-            "podping-ccc", "podping-ddd", "podping-eee",
-            "podping-fff", "podping-ggg", "brianoflondon",
-            "podcastindex", "podping.legacy", "podping.spk"
-        }
-    
-    def clean_old_urls(self):
-        """Remove URLs older than DEDUPE_WINDOW from tracking"""
-        current_time = time.time()
-        cutoff_time = current_time - DEDUPE_WINDOW
-        
-        urls_to_remove = [
-            url for url, timestamp in self.recent_url_times.items()
-            if timestamp < cutoff_time
-        ]
+    def rotate_recent_urls(self, current_time: float):
+        """Start a new dedupe generation, keeping the last one if still fresh"""
+        elapsed = current_time - self.window_start
+        if elapsed >= 2 * self.dedupe_window:
+            # Quiet spell: both generations are older than a window
+            self.previous_urls = set()
+            self.window_start = current_time
+        elif elapsed >= self.dedupe_window:
+            # Stay on the window grid so no URL outlives two windows
+            self.previous_urls = self.recent_urls
+            self.window_start += self.dedupe_window
+        else:
+            # Rotated early to cap memory
+            self.previous_urls = self.recent_urls
+            self.window_start = current_time
+        self.recent_urls = set()
         
-        for url in urls_to_remove:
-            del self.recent_url_times[url]
-            
-    def should_process_url(self, url: str) -> bool:
+    def should_process_url(self, url: str, current_time: float) -> bool:
         """Check if URL should be processed"""
-        current_time = time.time()
-        
-        if len(self.recent_url_times) > 2000:
-            self.clean_old_urls()
-        
-        if url in self.recent_url_times:
-            last_seen = self.recent_url_times[url]
-            if current_time - last_seen < DEDUPE_WINDOW:
-                self.stats['deduped'] += 1
-                return False
+        # URLs are suppressed for at least one and under two dedupe windows
+        if current_time - self.window_start >= self.dedupe_window or \
+           len(self.recent_urls) >= MAX_TRACKED_URLS:
+            self.rotate_recent_urls(current_time)
+            
+        if url in self.recent_urls or url in self.previous_urls:
+            self.stats['deduped'] += 1
+            return False
                 
-        self.recent_url_times[url] = current_time
+        self.recent_urls.add(url)
         return True
         
-    def process_podping(self, post_data: Dict[str, Any]):
-        """Process a single podping notification"""
+    def process_podping(self, json_str: str, now: float):
+        """Process the JSON payload of a single podping notification"""
         try:
-            json_data = json.loads(post_data.get("json", "{}"))
+            json_data = json_loads(json_str or "{}")
+            if type(json_data) is not dict:
+                return
+            
+            # Metadata-only payloads carry none of the URL field names
+            present = json_data.keys() & URL_FIELDS
+            if not present:
+                return
             
             # Extract URLs - handle multiple formats
-            urls = []
+            urls: List[Any] = []
             
-            # Check various field names used in podping
-            for field in ["urls", "url", "iris", "iri"]:
-                if field in json_data:
-                    data = json_data[field]
-                    if isinstance(data, list):
-                        urls.extend(data)
-                    elif isinstance(data, str):
-                        urls.append(data)
+            # Check only the URL field names this podping actually uses
+            for field in present:
+                data = json_data[field]
+                # Exact type checks; parsed JSON never yields subclasses
+                data_type = type(data)
+                if data_type is list:
+                    urls.extend(data)
+                elif data_type is str:
+                    urls.append(data)
             
             if not urls:
                 return
                 
-            # Process and deduplicate URLs
-            for url in urls:
-                if not isinstance(url, str):
-                    continue
-                    
-                # Basic URL validation
-                if not url.startswith(('http://', 'https://')):
-                    continue
-                    
-                # Check deduplication
-                if self.should_process_url(url):
-                    self.url_buffer.append(url)
-                    self.stats['processed'] += 1
+            # Keep well-formed URLs, then dedupe the whole list in one pass.
+            # Buffered URLs are still in the dedupe window, so this also
+            # keeps repeats out of the buffer.
+            buffer = self.url_buffer
+            should_process_url = self.should_process_url
+            urls = [
+                url for url in urls
+                if isinstance(url, str) and url.startswith(URL_SCHEMES)
+            ]
+            new_urls = [
+                url for url in urls
+                if should_process_url(url, now)
+            ]
+            
+            buffer.extend(new_urls)
+            self.stats['processed'] += len(new_urls)
                     
             # Flush if buffer is full or timeout reached
-            if len(self.url_buffer) >= BATCH_SIZE or \
-               time.time() - self.last_flush_time > BATCH_TIMEOUT:
-                self.flush_urls()
+            if len(buffer) >= self.batch_size or \
+               now - self.last_flush_time > self.batch_timeout:
+                self.flush_urls(now)
                 
         except json.JSONDecodeError as e:
-            logger.debug(f"Error parsing JSON: {e}")
+            logger.debug("Error parsing JSON: %s", e)
         except Exception as e:
-            logger.error(f"Error processing podping: {e}")
-            self.stats['errors'] += 1
+            logger.error("Error processing podping: %s", e)
+            self.count('errors')
+            
+    def count(self, key: str, amount: int = 1):
+        """Increment a stat shared with the sender threads"""
+        with self.stats_lock:
+            self.stats[key] += amount
+            
+    def flush_urls(self, now: Optional[float] = None):
+        """Queue accumulated URLs for the sender threads without blocking"""
+        # Take the retries and their block together, senders add both at once
+        with self.progress_lock:
+            retry_urls = list(self.retry_urls)
+            self.retry_urls.clear()
+            retry_block = self.retry_block
+            self.retry_block = None
+            
+        # Buffered URLs came from blocks since the previous flush
+        first_block = self.flushed_block or 0
+        self.flushed_block = self.resume_block
+        
+        if self.url_buffer or retry_urls:
+            # The buffer is already unique; only merged retries need deduping
+            if retry_urls:
+                unique_urls = list(dict.fromkeys(retry_urls + list(self.url_buffer)))
+                if retry_block is not None:
+                    first_block = min(first_block, retry_block)
+            else:
+                unique_urls = list(self.url_buffer)
+            self.url_buffer.clear()
+            self.last_flush_time = time.monotonic() if now is None else now
             
-    def flush_urls(self):
-        """Send accumulated URLs to PHP endpoint"""
-        if not self.url_buffer:
+            with self.progress_lock:
+                try:
+                    self.send_queue.put_nowait((first_block, unique_urls))
+                    self.pending_batches[first_block] = \
+                        self.pending_batches.get(first_block, 0) + 1
+                except queue.Full:
+                    # Senders are backed up; keep only the newest URLs for later
+                    logger.error("✗ Send queue full, holding back %d URLs", len(unique_urls))
+                    self.count('errors')
+                    self.hold_back(first_block, unique_urls)
+        
+        self.save_progress()
+        
+    def hold_back(self, first_block: int, unique_urls: List[str]):
+        """Keep URLs for the next flush (caller holds progress_lock)"""
+        self.retry_urls.extend(unique_urls)
+        if self.retry_block is None or first_block < self.retry_block:
+            self.retry_block = first_block
+            
+    def save_progress(self):
+        """Checkpoint the last block whose URLs have all been sent or given up"""
+        if self.flushed_block is None:
             return
+        with self.progress_lock:
+            oldest = min(self.pending_batches, default=self.flushed_block)
+            if self.retry_block is not None:
+                oldest = min(oldest, self.retry_block)
+        block_num = min(oldest, self.flushed_block) - 1
+        if block_num > 0 and block_num != self.saved_block:
+            self.save_checkpoint(block_num)
+            self.saved_block = block_num
             
-        unique_urls = list(dict.fromkeys(self.url_buffer))
+    def load_checkpoint(self) -> Optional[int]:
+        """Read the last fully processed block from the state file"""
+        if not self.state_file:
+            return None
+        try:
+            with open(self.state_file) as f:
+                return int(json.load(f)["block"])
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning("Ignoring unreadable state file %s: %s", self.state_file, e)
+            return None
+            
+    def save_checkpoint(self, block_num: int):
+        """Atomically record the last fully processed block"""
+        if not self.state_file:
+            return
+        tmp_file = f"{self.state_file}.tmp"
+        try:
+            with open(tmp_file, "w") as f:
+                json.dump({"block": block_num}, f)
+            os.replace(tmp_file, self.state_file)
+        except OSError as e:
+            logger.warning("Disabling checkpoints, cannot write %s: %s", self.state_file, e)
+            self.state_file = None
+        
+    def send_urls(self, first_block: int, unique_urls: List[str]):
+        """Send a batch of URLs to PHP endpoint (runs on a sender thread)"""
         batch_size = len(unique_urls)
+        body = json_dumps({"urls": unique_urls})
+        headers = SEND_HEADERS
+        
+        # Level 1 is plenty for URL lists and costs next to nothing
+        if COMPRESS_MIN_BYTES and len(body) > COMPRESS_MIN_BYTES:
+            body = gzip.compress(body, compresslevel=1)
+            headers = GZIP_SEND_HEADERS
         
         try:
-            response = self.http_session.post(
+            response = self.http_pool.request(
+                "POST",
                 TARGET_URL,
-                json={"urls": unique_urls},
-                timeout=10,
-                headers={
-                    'Content-Type': 'application/json',
-                    'User-Agent': 'PodPing-Watcher/1.0'
-                }
+                body=body,
+                headers=headers
             )
             
-            if response.status_code == 200:
-                logger.info(f"✓ Sent {batch_size} URLs")
-                self.stats['sent'] += batch_size
-                self.url_buffer = []
+            if response.status == 200:
+                logger.info("✓ Sent %d URLs", batch_size)
+                self.count('sent', batch_size)
             else:
-                logger.error(f"✗ Server returned {response.status_code}")
-                self.stats['errors'] += 1
-                self.url_buffer = []
+                logger.error("✗ Server returned %d", response.status)
+                self.count('errors')
                 
-        except requests.exceptions.Timeout:
-            logger.error(f"✗ Timeout sending to {TARGET_URL}")
-            self.stats['errors'] += 1
-            self.url_buffer = []
-        except requests.exceptions.RequestException as e:
-            logger.error(f"✗ HTTP request failed: {e}")
-            self.stats['errors'] += 1
-            if len(self.url_buffer) > 100:
-                self.url_buffer = self.url_buffer[-100:]
-        finally:
-            self.last_flush_time = time.time()
+        except urllib3.exceptions.HTTPError as e:
+            self.count('errors')
+            # Retries wrap the underlying error in MaxRetryError.reason;
+            # NewConnectionError subclasses ConnectTimeoutError in urllib3
+            reason = getattr(e, 'reason', e)
+            if isinstance(reason, urllib3.exceptions.TimeoutError) and \
+               not isinstance(reason, urllib3.exceptions.NewConnectionError):
+                logger.error("✗ Timeout sending to %s", TARGET_URL)
+            else:
+                logger.error("✗ HTTP request failed: %s", e)
+                # Keep the newest URLs around for the next flush
+                with self.progress_lock:
+                    self.hold_back(first_block, unique_urls)
+                
+    def sender_loop(self):
+        """Send queued batches until stopped and the queue is empty"""
+        while True:
+            try:
+                first_block, unique_urls = self.send_queue.get(timeout=1)
+            except queue.Empty:
+                if self.stopped.is_set():
+                    return
+                continue
+            try:
+                self.send_urls(first_block, unique_urls)
+            finally:
+                # Failed URLs are already held back with their block
+                with self.progress_lock:
+                    remaining = self.pending_batches[first_block] - 1
+                    if remaining:
+                        self.pending_batches[first_block] = remaining
+                    else:
+                        del self.pending_batches[first_block]
+                self.send_queue.task_done()
+                
+    def drain(self):
+        """Flush the buffer and wait for queued sends to finish"""
+        # Senders exit once stopped and idle, so only stop them after the
+        # final batches are sent; the second pass picks up failed sends
+        for _ in range(2):
+            self.flush_urls()
+            self.send_queue.join()
+        self.save_progress()
+        self.stopped.set()
+            
+    def stream_posts(
+        self,
+        client: HiveClient,
+        start_block: int,
+        posts: 'queue.Queue[Union[Tuple[int, Dict[str, Any]], Exception]]',
+        stop: threading.Event
+    ):
+        """Feed podpings and their block numbers to run() (runs on the stream thread)"""
+        try:
+            for item in client.stream(start_block, WATCHED_PREFIXES):
+                if not self.hand_over(posts, item, stop):
+                    return
+        except Exception as e:
+            # Raised in run() once the podpings read before it are processed
+            self.hand_over(posts, e, stop)
             
+    def hand_over(
+        self,
+        posts: 'queue.Queue[Union[Tuple[int, Dict[str, Any]], Exception]]',
+        item: Union[Tuple[int, Dict[str, Any]], Exception],
+        stop: threading.Event
+    ) -> bool:
+        """Queue item for run(), giving up once it stops reading"""
+        while not stop.is_set():
+            try:
+                posts.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+        
     def log_stats(self):
         """Log statistics periodically"""
-        uptime = (datetime.now(timezone.utc) - self.stats['start_time']).total_seconds()
+        uptime = time.monotonic() - self.start_monotonic
         rate = self.stats['processed'] / uptime if uptime > 0 else 0
         
         logger.info(
-            f"📊 Processed: {self.stats['processed']}, "
-            f"Sent: {self.stats['sent']}, "
-            f"Deduped: {self.stats['deduped']}, "
-            f"Errors: {self.stats['errors']}, "
-            f"Rate: {rate:.1f}/sec"
+            "📊 Processed: %d, Sent: %d, Deduped: %d, Errors: %d, Rate: %.1f/sec",
+            self.stats['processed'], self.stats['sent'],
+            self.stats['deduped'], self.stats['errors'], rate
         )
         
-    def run(self):
+    def stats_loop(self):
+        """Log statistics every STATS_INTERVAL seconds until stopped"""
+        while not self.stopped.wait(STATS_INTERVAL):
+            self.log_stats()
+            
+    def run(self) -> None:
         """Main watch loop"""
         logger.info("=== PodPing Watcher Started ===")
-        logger.info(f"Target: {TARGET_URL}")
-        logger.info(f"Batch: {BATCH_SIZE} URLs / {BATCH_TIMEOUT}s")
-        logger.info(f"Dedupe window: {DEDUPE_WINDOW}s")
+        logger.info("Target: %s", TARGET_URL)
+        logger.info("Batch: %d URLs / %ds", BATCH_SIZE, BATCH_TIMEOUT)
+        logger.info("Dedupe window: %ds", DEDUPE_WINDOW)
         
-        allowed_accounts = self.get_allowed_accounts()
-        logger.info(f"Monitoring {len(allowed_accounts)} accounts")
+        allowed_accounts = ALLOWED_ACCOUNTS
+        logger.info("Monitoring %d accounts", len(allowed_accounts))
         
         # Quick node connectivity test with shorter timeout
-        blockchain = None
-        hive = None
+        client = HiveClient(HIVE_NODES, timeout=10)
+        client.connect()
         
-        for node in HIVE_NODES:
-            try:
-                logger.info(f"Testing node: {node}")
-                
-                # Create Hive instance with short timeout
-                hive = beem.Hive(
-                    node=node,
-                    num_retries=1,
-                    num_retries_call=1,
-                    timeout=10
-                )
-                
-                # Create blockchain instance
-                blockchain = Blockchain(blockchain_instance=hive, mode="head")
-                
-                # Quick connectivity test - get current block num
-                current_block = blockchain.get_current_block_num()
-                logger.info(f"✓ Connected to {node} at block {current_block}")
-                break
-                
-            except Exception as e:
-                logger.warning(f"Failed {node}: {str(e)[:100]}")
-                continue
+        # Calculate starting block from the head seen while connecting
+        current_block = client.estimate_head_block()
+        blocks_back = LOOKBACK_MINUTES * 20  # 20 blocks per minute
+        start_block = max(1, current_block - blocks_back)
         
-        if not blockchain:
-            raise Exception("Could not connect to any Hive node")
+        # Resume after the last checkpoint if it falls inside the lookback
+        checkpoint = self.load_checkpoint()
+        if checkpoint and start_block <= checkpoint < current_block:
+            start_block = checkpoint + 1
+            logger.info("Resuming from block %d (checkpoint)", start_block)
+        else:
+            logger.info("Starting from block %d (%d min ago)", start_block, LOOKBACK_MINUTES)
+        self.resume_block = self.flushed_block = start_block
         
-        # Calculate starting block
-        try:
-            current_block = blockchain.get_current_block_num()
-            blocks_back = LOOKBACK_MINUTES * 20  # 20 blocks per minute
-            start_block = max(1, current_block - blocks_back)
-            logger.info(f"Starting from block {start_block} ({LOOKBACK_MINUTES} min ago)")
-        except:
-            start_block = None
-            logger.info("Starting from current block")
-        
-        last_stats_time = time.time()
+        batch_timeout = self.batch_timeout
         error_count = 0
         max_errors = 10
         
         while self.running:
+            # Read the chain on its own thread so flushes never stall RPC reads
+            posts: 'queue.Queue[Union[Tuple[int, Dict[str, Any]], Exception]]' = \
+                queue.Queue(maxsize=POST_QUEUE_SIZE)
+            stop = threading.Event()
+            client.next_block = start_block
+            producer = threading.Thread(
+                target=self.stream_posts,
+                args=(client, start_block, posts, stop),
+                name='stream',
+                daemon=True
+            )
+            producer.start()
+            
+            # Bound once per stream rather than looked up per podping
+            get_post = posts.get
+            monotonic = time.monotonic
+            process_podping = self.process_podping
+            
             try:
-                # Set up stream
-                stream_params = {
-                    "opNames": ["custom_json"],
-                    "raw_ops": False,
-                    "threading": False,
-                    "max_batch_size": 50
-                }
-                
-                if start_block:
-                    stream_params["start"] = start_block
-                
-                stream = blockchain.stream(**stream_params)
-
-                for post in stream:
+                while self.running:
+                    # Podpings from earlier blocks are all queued or processed
+                    next_block = client.next_block
+                    try:
+                        item = get_post(timeout=batch_timeout)
+                    except queue.Empty:
+                        # Idle: nothing is pending, so flush and move on
+                        self.resume_block = next_block
+                        self.flush_urls()
+                        continue
+                        
+                    if isinstance(item, Exception):
+                        # The stream thread has exited after everything it read
+                        self.resume_block = client.next_block
+                        raise item
+                        
                     error_count = 0  # Reset only after successful iteration
-                    if not self.running:
-                        break
+                    self.resume_block, post = item
+                    now = monotonic()
                         
-                    # Check if it's a podping
-                    op_id = post.get("id", "")
-                    if any(op_id.startswith(prefix) for prefix in ["podping", "pp"]):
-                        # Check authorization
-                        posting_auths = post.get("required_posting_auths", [])
+                    # Check authorization; the stream only yields podping ids
+                    try:
+                        posting_auths = post["required_posting_auths"]
                         if posting_auths and posting_auths[0] in allowed_accounts:
-                            self.process_podping(post)
+                            process_podping(post["json"], now)
+                    except KeyError:
+                        pass  # Malformed custom_json, not a podping
                             
                     # Periodic flush
-                    if time.time() - self.last_flush_time > BATCH_TIMEOUT:
-                        self.flush_urls()
-                        
-                    # Stats every 60 seconds
-                    if time.time() - last_stats_time > 60:
-                        self.log_stats()
-                        last_stats_time = time.time()
+                    if now - self.last_flush_time > batch_timeout:
+                        self.flush_urls(now)
                         
             except Exception as e:
+                stop.set()
+                producer.join()
                 error_count += 1
-                logger.error(f"Stream error ({error_count}/{max_errors}): {str(e)[:200]}")
+                logger.error("Stream error (%d/%d): %.200s", error_count, max_errors, e)
                 
                 if error_count >= max_errors:
                     logger.error("Too many errors, restarting...")
@@ -360,13 +770,16 @@ class PodPingWatcher:
                     
                 time.sleep(min(error_count * 2, 30))
                 
-                # Try to reconnect
+                # Try to reconnect, resuming where the stream left off
                 try:
-                    blockchain = Blockchain(blockchain_instance=hive, mode="head")
-                    start_block = None  # Start fresh
-                    logger.info("Reconnected")
+                    client.connect()
+                    if self.resume_block is not None:
+                        start_block = self.resume_block
+                    logger.info("Reconnected, resuming at block %s", start_block)
                 except Exception as re:
-                    logger.error(f"Reconnect failed: {re}")
+                    logger.error("Reconnect failed: %s", re)
+            finally:
+                stop.set()
                 
         logger.info("Watcher stopped")
 
@@ -379,15 +792,24 @@ def main():
         try:
             watcher = PodPingWatcher()
             watcher.run()
+            # run() only returns once a shutdown signal was received
+            watcher.drain()
+            logger.info("Final stats: %s", watcher.stats)
+            break
         except KeyboardInterrupt:
             logger.info("Interrupted by user")
             if watcher:
-                watcher.flush_urls()
+                watcher.drain()
             break
         except Exception as e:
-            logger.exception(f"Error: {e}")
+            logger.exception("Error: %s", e)
+            if watcher:
+                # Senders finish what is queued, then exit
+                watcher.stopped.set()
             logger.info("Restarting in 30 seconds...")
             time.sleep(30)
+            if watcher and not watcher.running:
+                break  # Shutdown signal arrived while waiting
 
 if __name__ == "__main__":
     main()
\ No newline at end of file